@@ -0,0 +1,18 @@
+# Gunicorn settings, picked up automatically when gunicorn is started from `src/python/mcp`:
+# `poetry run gunicorn mcp_fastapi.main:app`
+import multiprocessing
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+
+# UvicornWorker runs each process on uvloop/httptools (both installed with uvicorn[standard]).
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Without MCP_REDIS_URL, pools live in each worker's own memory and a pool created through
+# one worker is not visible to the others, so default to a single worker in that case.
+# With a shared Redis store, default to the usual `2 * CPU + 1`.
+if os.environ.get("MCP_REDIS_URL"):
+    default_workers = 2 * multiprocessing.cpu_count() + 1
+else:
+    default_workers = 1
+workers = int(os.environ.get("WEB_CONCURRENCY", default_workers))
@@ -0,0 +1,75 @@
+# Synchronous pool mutation hot path, kept free of async code and untyped third-party
+# imports so it can be compiled to a C extension with mypyc:
+# `poetry run mypyc mcp_fastapi/core.py` (run from `src/python/mcp`).
+# The compiled module is picked up automatically in place of this file; without it,
+# this plain Python version is used unchanged.
+from typing import Dict, List, Optional, Tuple, Union
+
+# One collateral record: (asset_id, amount, value_usd)
+CollateralRow = Tuple[str, float, float]
+
+
+class PoolStore:
+    """
+    In-memory state of a pool. Collaterals are `table = (rows, latest)`: an
+    append-only list of immutable rows plus a map from each asset to the index of
+    its current row. An update appends a new row and then repoints the index, so
+    existing rows are never mutated and a reader always sees a complete record
+    (copy-on-write). `latest` insertion order doubles as the order collaterals were
+    first added. Superseded rows are dropped by `compact`, which publishes a new
+    table with a single assignment; readers take one snapshot of `table` so they
+    never pair an index with the wrong row list.
+    `json_cache` holds the encoded pool body and is reset to None by every mutation.
+    """
+    __slots__ = ("pool_id", "table", "total_value_usd", "is_active", "json_cache")
+
+    def __init__(self, pool_id: str, is_active: bool = True) -> None:
+        self.pool_id = pool_id
+        self.table: Tuple[List[CollateralRow], Dict[str, int]] = ([], {})
+        self.total_value_usd = 0.0
+        self.is_active = is_active
+        self.json_cache: Optional[bytes] = None
+
+def add_collateral(store: PoolStore, asset_id: str, amount: float, value_usd: float) -> None:
+    """
+    Adds an asset to the pool, or tops up its amount and value if it is already there,
+    and updates the pool total incrementally.
+    """
+    rows, latest = store.table
+    index = latest.get(asset_id)
+    if index is not None:
+        # Update existing collateral by appending its new state
+        _, existing_amount, existing_value_usd = rows[index]
+        rows.append((asset_id, existing_amount + amount, existing_value_usd + value_usd)) # Simplistic update, real scenario might involve price oracles
+    else:
+        # Add new collateral
+        rows.append((asset_id, amount, value_usd))
+    # Publish the new row only once it is fully in place
+    latest[asset_id] = len(rows) - 1
+    store.total_value_usd += value_usd
+
+def compact(store: PoolStore) -> None:
+    """
+    Drops superseded rows once they outnumber the live ones. Builds a fresh row list
+    and index and swaps them in as one table, so memory stays within twice the
+    number of assets and the copy is amortised over many writes.
+    """
+    rows, latest = store.table
+    if len(rows) <= 2 * len(latest):
+        return
+    live_rows = [rows[index] for index in latest.values()]
+    store.table = (live_rows, {row[0]: index for index, row in enumerate(live_rows)})
+
+def calculate_pool_value(store: PoolStore) -> float:
+    """Recalculates the total value of a pool based on its collaterals."""
+    rows, latest = store.table
+    return sum(rows[index][2] for index in latest.values())
+
+def collaterals_as_dicts(store: PoolStore) -> List[Dict[str, Union[str, float]]]:
+    """Lays the current collateral rows out in the `Collateral` response shape as plain dicts."""
+    rows, latest = store.table
+    collaterals: List[Dict[str, Union[str, float]]] = []
+    for index in latest.values():
+        asset_id, amount, value_usd = rows[index]
+        collaterals.append({"asset_id": asset_id, "amount": amount, "value_usd": value_usd})
+    return collaterals
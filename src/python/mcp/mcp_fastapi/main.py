@@ -1,12 +1,25 @@
-from typing import Dict, List, Optional
+import os
+from typing import List, Union
 
-from fastapi import FastAPI, HTTPException, status
+import orjson
+from fastapi import FastAPI, Response, status
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel, Field
 
+from mcp_fastapi.storage import (
+    InMemoryPoolRepository,
+    PoolExistsError,
+    PoolInactiveError,
+    PoolNotFoundError,
+    PoolRepository,
+    db,
+)
+
 app = FastAPI(
     title="Python MCP FastAPI",
     description="A Multi-Collateral Pool (MCP) system implemented in Python with FastAPI.",
     version="0.1.0",
+    default_response_class=ORJSONResponse,
 )
 
 # --- Pydantic Models (Data Structures) ---
@@ -18,115 +31,159 @@ class Collateral(BaseModel):
 
 class Pool(BaseModel):
     pool_id: str = Field(..., description="Unique identifier for the pool")
-    collaterals: List[Collateral] = []
+    collaterals: List[Collateral] = Field(default_factory=list)
     total_value_usd: float = 0.0
     is_active: bool = True
 
-# In-memory storage for simplicity
-db: Dict[str, Pool] = {}
+class PoolCreateRequest(BaseModel):
+    pool_id: str = Field(..., description="Unique identifier for the pool")
+    is_active: bool = True
+
+class PoolStatusUpdate(BaseModel):
+    is_active: bool
+
+# The root endpoint's body never changes, so it is encoded once at import
+_ROOT_BODY = orjson.dumps({"message": "Welcome to Python MCP FastAPI"})
+
+# Error details, formatted only on the error path
+_POOL_NOT_FOUND_DETAIL = "Pool '{}' not found"
+_POOL_EXISTS_DETAIL = "Pool '{}' already exists"
+_POOL_INACTIVE_DETAIL = "Pool '{}' is not active. Cannot add collateral."
+
+# Pools are kept in this process unless MCP_REDIS_URL points at a Redis server shared by all workers
+REDIS_URL = os.environ.get("MCP_REDIS_URL")
 
-# --- Helper Functions (MCP Logic Placeholder) ---
+pools: PoolRepository
+if REDIS_URL:
+    from mcp_fastapi.redis_store import RedisPoolRepository # Optional dependency: `poetry install -E redis`
 
-def _calculate_pool_value(pool: Pool) -> float:
-    """Recalculates the total value of a pool based on its collaterals."""
-    return sum(c.value_usd for c in pool.collaterals)
+    redis_pools = RedisPoolRepository.from_url(REDIS_URL)
+    app.add_event_handler("shutdown", redis_pools.close)
+    pools = redis_pools
+else:
+    pools = InMemoryPoolRepository(db)
 
-def _get_pool_or_404(pool_id: str) -> Pool:
-    """Retrieves a pool or raises HTTPException if not found."""
-    pool = db.get(pool_id)
-    if not pool:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Pool '{pool_id}' not found")
-    return pool
+# --- Helper Functions ---
+
+def _json_response(content: Union[bytes, str], status_code: int = status.HTTP_200_OK) -> Response:
+    """Wraps already-encoded JSON so FastAPI skips `jsonable_encoder` and response validation."""
+    return Response(content=content, status_code=status_code, media_type="application/json")
+
+def _error_response(status_code: int, detail: str) -> ORJSONResponse:
+    """
+    Builds the same `{"detail": ...}` body as FastAPI's HTTPException handler,
+    without raising and unwinding through the exception middleware.
+    """
+    return ORJSONResponse({"detail": detail}, status_code=status_code)
 
 # --- FastAPI Endpoints ---
 
 @app.post("/pools/", response_model=Pool, status_code=status.HTTP_201_CREATED, tags=["Pools"])
-async def create_pool(pool_id: str, is_active: Optional[bool] = True) -> Pool:
+async def create_pool(body: PoolCreateRequest) -> Response:
     """
     Creates a new, empty collateral pool.
     """
-    if pool_id in db:
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail=f"Pool '{pool_id}' already exists"
-        )
-    new_pool = Pool(pool_id=pool_id, is_active=is_active)
-    db[pool_id] = new_pool
-    return new_pool
+    try:
+        content = await pools.create_pool(body.pool_id, body.is_active)
+    except PoolExistsError:
+        return _error_response(status.HTTP_409_CONFLICT, _POOL_EXISTS_DETAIL.format(body.pool_id))
+    return _json_response(content, status_code=status.HTTP_201_CREATED)
 
 @app.get("/pools/{pool_id}", response_model=Pool, tags=["Pools"])
-async def get_pool(pool_id: str) -> Pool:
+async def get_pool(pool_id: str) -> Response:
     """
     Retrieves details of a specific collateral pool.
     """
-    return _get_pool_or_404(pool_id)
+    try:
+        return _json_response(await pools.get_pool_json(pool_id))
+    except PoolNotFoundError:
+        return _error_response(status.HTTP_404_NOT_FOUND, _POOL_NOT_FOUND_DETAIL.format(pool_id))
 
 @app.post("/pools/{pool_id}/collaterals/", response_model=Pool, tags=["Collaterals"])
-async def add_collateral_to_pool(pool_id: str, collateral: Collateral) -> Pool:
+async def add_collateral_to_pool(pool_id: str, collateral: Collateral) -> Response:
     """
     Adds a new collateral asset to an existing pool.
     If the asset already exists in the pool, its amount and value will be updated.
     """
-    pool = _get_pool_or_404(pool_id)
-    if not pool.is_active:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Pool '{pool_id}' is not active. Cannot add collateral."
-        )
-
-    existing_collateral_index = -1
-    for i, c in enumerate(pool.collaterals):
-        if c.asset_id == collateral.asset_id:
-            existing_collateral_index = i
-            break
-
-    if existing_collateral_index != -1:
-        # Update existing collateral
-        pool.collaterals[existing_collateral_index].amount += collateral.amount
-        pool.collaterals[existing_collateral_index].value_usd += collateral.value_usd # Simplistic update, real scenario might involve price oracles
-    else:
-        # Add new collateral
-        pool.collaterals.append(collateral)
-
-    pool.total_value_usd = _calculate_pool_value(pool)
-    return pool
+    try:
+        content = await pools.add_collaterals(pool_id, (collateral,))
+    except PoolNotFoundError:
+        return _error_response(status.HTTP_404_NOT_FOUND, _POOL_NOT_FOUND_DETAIL.format(pool_id))
+    except PoolInactiveError:
+        return _error_response(status.HTTP_400_BAD_REQUEST, _POOL_INACTIVE_DETAIL.format(pool_id))
+    return _json_response(content)
+
+@app.post("/pools/{pool_id}/collaterals/batch", response_model=Pool, tags=["Collaterals"])
+async def add_collaterals_to_pool_batch(pool_id: str, collaterals: List[Collateral]) -> Response:
+    """
+    Adds several collateral assets to an existing pool in one request.
+    Assets already in the pool (or repeated within the batch) are merged the
+    same way as in the single-asset endpoint.
+    """
+    try:
+        content = await pools.add_collaterals(pool_id, collaterals)
+    except PoolNotFoundError:
+        return _error_response(status.HTTP_404_NOT_FOUND, _POOL_NOT_FOUND_DETAIL.format(pool_id))
+    except PoolInactiveError:
+        return _error_response(status.HTTP_400_BAD_REQUEST, _POOL_INACTIVE_DETAIL.format(pool_id))
+    return _json_response(content)
 
 @app.get("/pools/{pool_id}/collaterals/", response_model=List[Collateral], tags=["Collaterals"])
-async def get_collaterals_in_pool(pool_id: str) -> List[Collateral]:
+async def get_collaterals_in_pool(pool_id: str) -> Response:
     """
     Lists all collateral assets in a specific pool.
     """
-    pool = _get_pool_or_404(pool_id)
-    return pool.collaterals
+    try:
+        return _json_response(await pools.get_collaterals_json(pool_id))
+    except PoolNotFoundError:
+        return _error_response(status.HTTP_404_NOT_FOUND, _POOL_NOT_FOUND_DETAIL.format(pool_id))
 
 @app.put("/pools/{pool_id}/status", response_model=Pool, tags=["Pools"])
-async def update_pool_status(pool_id: str, is_active: bool) -> Pool:
+async def update_pool_status(pool_id: str, body: PoolStatusUpdate) -> Response:
     """
     Activates or deactivates a collateral pool.
     """
-    pool = _get_pool_or_404(pool_id)
-    pool.is_active = is_active
-    return pool
+    try:
+        content = await pools.set_pool_status(pool_id, body.is_active)
+    except PoolNotFoundError:
+        return _error_response(status.HTTP_404_NOT_FOUND, _POOL_NOT_FOUND_DETAIL.format(pool_id))
+    return _json_response(content)
+
+@app.post("/pools/{pool_id}/recompute", response_model=Pool, tags=["Pools"])
+async def recompute_pool_value(pool_id: str) -> Response:
+    """
+    Recalculates a pool's total value from its collaterals.
+    The total is maintained incrementally on every write, so this is only
+    needed to correct accumulated floating-point drift.
+    """
+    try:
+        content = await pools.recompute_pool_value(pool_id)
+    except PoolNotFoundError:
+        return _error_response(status.HTTP_404_NOT_FOUND, _POOL_NOT_FOUND_DETAIL.format(pool_id))
+    return _json_response(content)
 
 @app.delete("/pools/{pool_id}", status_code=status.HTTP_204_NO_CONTENT, tags=["Pools"])
 async def delete_pool(pool_id: str):
     """
     Deletes a collateral pool.
     """
-    _get_pool_or_404(pool_id) # Ensure it exists before deleting
-    del db[pool_id]
+    try:
+        await pools.delete_pool(pool_id)
+    except PoolNotFoundError:
+        return _error_response(status.HTTP_404_NOT_FOUND, _POOL_NOT_FOUND_DETAIL.format(pool_id))
     return None
 
 # A simple root endpoint for health check or info
 @app.get("/", tags=["Root"])
 async def read_root():
-    return {"message": "Welcome to Python MCP FastAPI"}
+    return _json_response(_ROOT_BODY)
 
 if __name__ == "__main__":
     import uvicorn
     # This is for running locally, Uvicorn will be run by `poetry run uvicorn mcp_fastapi.main:app --reload`
-    # from the `src/python/mcp` directory.
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True, reload_dirs=["."])
+    # from the `src/python/mcp` directory. Run this file as `python -m mcp_fastapi.main` from there too,
+    # since the storage modules are imported through the `mcp_fastapi` package.
+    uvicorn.run("mcp_fastapi.main:app", host="0.0.0.0", port=8000, reload=True, reload_dirs=["."], loop="uvloop", http="httptools")
 
 # To make `app` discoverable by Uvicorn when running from `src/python/mcp` directory:
 # `poetry run uvicorn mcp_fastapi.main:app --reload`
@@ -0,0 +1,151 @@
+from typing import Awaitable, Dict, Iterable, List, Union, cast
+
+import orjson
+from redis.asyncio import Redis
+
+from mcp_fastapi.storage import CollateralLike, PoolExistsError, PoolInactiveError, PoolNotFoundError
+
+# Each pool is a single Redis hash at `pool:<pool_id>`, so every write is one atomic
+# script on one key and a read is one HGETALL. Besides `is_active` and `total_value_usd`,
+# every asset gets three fields: `a:<asset_id>` (amount), `v:<asset_id>` (value in USD)
+# and `o:<asset_id>` (ordinal, to keep collaterals in the order they were first added).
+# The prefixes keep asset ids from ever colliding with the pool-level fields.
+_KEY_PREFIX = "pool:"
+
+# Scripts return 0 for a missing pool, 1 for an inactive pool, otherwise the pool's HGETALL.
+_ADD_COLLATERALS_SCRIPT = """
+local pool = KEYS[1]
+local is_active = redis.call('HGET', pool, 'is_active')
+if not is_active then return 0 end
+if is_active ~= '1' then return 1 end
+for i = 2, #ARGV, 3 do
+    local asset_id = ARGV[i]
+    if redis.call('HEXISTS', pool, 'a:' .. asset_id) == 0 then
+        redis.call('HSET', pool, 'o:' .. asset_id, redis.call('HINCRBY', pool, 'asset_count', 1))
+    end
+    redis.call('HINCRBYFLOAT', pool, 'a:' .. asset_id, ARGV[i + 1])
+    redis.call('HINCRBYFLOAT', pool, 'v:' .. asset_id, ARGV[i + 2])
+end
+redis.call('HINCRBYFLOAT', pool, 'total_value_usd', ARGV[1])
+return redis.call('HGETALL', pool)
+"""
+
+_SET_STATUS_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then return 0 end
+redis.call('HSET', KEYS[1], 'is_active', ARGV[1])
+return redis.call('HGETALL', KEYS[1])
+"""
+
+_RECOMPUTE_SCRIPT = """
+local pool = KEYS[1]
+if redis.call('EXISTS', pool) == 0 then return 0 end
+local fields = redis.call('HGETALL', pool)
+local total = 0
+for i = 1, #fields, 2 do
+    if string.sub(fields[i], 1, 2) == 'v:' then
+        total = total + tonumber(fields[i + 1])
+    end
+end
+redis.call('HSET', pool, 'total_value_usd', string.format('%.17g', total))
+return redis.call('HGETALL', pool)
+"""
+
+def _hgetall(redis: Redis, pool_id: str) -> "Awaitable[Dict[bytes, bytes]]":
+    """HGETALL of a pool's hash, typed as bytes since the client never sets `decode_responses`."""
+    return cast("Awaitable[Dict[bytes, bytes]]", redis.hgetall(_KEY_PREFIX + pool_id))
+
+def _hash_from_reply(reply: List[bytes]) -> Dict[bytes, bytes]:
+    """Turns a flat HGETALL reply from a script into the dict redis-py returns for HGETALL."""
+    fields = iter(reply)
+    return dict(zip(fields, fields))
+
+def _collaterals_from_hash(fields: Dict[bytes, bytes]) -> List[Dict[str, Union[str, float]]]:
+    """Lays the hash's per-asset fields out in the `Collateral` response shape, in insertion order."""
+    ordered_assets = sorted(
+        (int(ordinal), key[2:]) for key, ordinal in fields.items() if key.startswith(b"o:")
+    )
+    return [
+        {
+            "asset_id": asset_id.decode(),
+            "amount": float(fields[b"a:" + asset_id]),
+            "value_usd": float(fields[b"v:" + asset_id]),
+        }
+        for _, asset_id in ordered_assets
+    ]
+
+def _pool_json_from_hash(pool_id: str, fields: Dict[bytes, bytes]) -> bytes:
+    """Encodes a pool hash in the `Pool` response shape."""
+    return orjson.dumps({
+        "pool_id": pool_id,
+        "collaterals": _collaterals_from_hash(fields),
+        "total_value_usd": float(fields.get(b"total_value_usd", 0)),
+        "is_active": fields[b"is_active"] == b"1",
+    })
+
+class RedisPoolRepository:
+    """
+    Keeps pools in Redis so every worker process pointed at the same server
+    sees the same pools. Writes run as Lua scripts, so concurrent updates from
+    different workers to the same pool are applied atomically.
+    """
+
+    def __init__(self, redis: Redis) -> None:
+        self.redis = redis
+        self._add_collaterals = redis.register_script(_ADD_COLLATERALS_SCRIPT)
+        self._set_status = redis.register_script(_SET_STATUS_SCRIPT)
+        self._recompute = redis.register_script(_RECOMPUTE_SCRIPT)
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisPoolRepository":
+        return cls(Redis.from_url(url))
+
+    async def close(self) -> None:
+        await self.redis.aclose()
+
+    async def create_pool(self, pool_id: str, is_active: bool) -> bytes:
+        if not await self.redis.hsetnx(_KEY_PREFIX + pool_id, "is_active", "1" if is_active else "0"):
+            raise PoolExistsError(pool_id)
+        return orjson.dumps({"pool_id": pool_id, "collaterals": [], "total_value_usd": 0.0, "is_active": is_active})
+
+    async def get_pool_json(self, pool_id: str) -> bytes:
+        fields = await _hgetall(self.redis, pool_id)
+        if not fields:
+            raise PoolNotFoundError(pool_id)
+        return _pool_json_from_hash(pool_id, fields)
+
+    async def get_collaterals_json(self, pool_id: str) -> bytes:
+        fields = await _hgetall(self.redis, pool_id)
+        if not fields:
+            raise PoolNotFoundError(pool_id)
+        return orjson.dumps(_collaterals_from_hash(fields))
+
+    async def add_collaterals(self, pool_id: str, collaterals: Iterable[CollateralLike]) -> bytes:
+        args: List[Union[str, float]] = [0.0]
+        added_value_usd = 0.0
+        for collateral in collaterals:
+            args += (collateral.asset_id, collateral.amount, collateral.value_usd)
+            added_value_usd += collateral.value_usd
+        args[0] = added_value_usd
+
+        reply = await self._add_collaterals(keys=[_KEY_PREFIX + pool_id], args=args)
+        if reply == 0:
+            raise PoolNotFoundError(pool_id)
+        if reply == 1:
+            raise PoolInactiveError(pool_id)
+        return _pool_json_from_hash(pool_id, _hash_from_reply(reply))
+
+    async def set_pool_status(self, pool_id: str, is_active: bool) -> bytes:
+        reply = await self._set_status(keys=[_KEY_PREFIX + pool_id], args=["1" if is_active else "0"])
+        if reply == 0:
+            raise PoolNotFoundError(pool_id)
+        return _pool_json_from_hash(pool_id, _hash_from_reply(reply))
+
+    async def recompute_pool_value(self, pool_id: str) -> bytes:
+        reply = await self._recompute(keys=[_KEY_PREFIX + pool_id])
+        if reply == 0:
+            raise PoolNotFoundError(pool_id)
+        return _pool_json_from_hash(pool_id, _hash_from_reply(reply))
+
+    async def delete_pool(self, pool_id: str) -> None:
+        if not await self.redis.delete(_KEY_PREFIX + pool_id):
+            raise PoolNotFoundError(pool_id)
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+from typing import Iterable, Optional, Protocol
+
+import orjson
+from lru import LRU
+
+from mcp_fastapi.core import PoolStore, add_collateral, calculate_pool_value, collaterals_as_dicts, compact
+
+logger = logging.getLogger(__name__)
+
+# --- Errors ---
+
+class PoolNotFoundError(Exception):
+    """Raised when the requested pool does not exist."""
+
+class PoolExistsError(Exception):
+    """Raised when creating a pool whose id is already taken."""
+
+class PoolInactiveError(Exception):
+    """Raised when adding collateral to a deactivated pool."""
+
+# --- Repository Interface ---
+
+class CollateralLike(Protocol):
+    """Anything carrying the three `Collateral` fields, e.g. the validated request model."""
+    asset_id: str
+    amount: float
+    value_usd: float
+
+class PoolRepository(Protocol):
+    """
+    Storage backend used by the endpoints. Every read and write returns the
+    affected data already encoded in its response shape, so handlers can hand
+    the bytes straight to a `Response`.
+    """
+    async def create_pool(self, pool_id: str, is_active: bool) -> bytes: ...
+    async def get_pool_json(self, pool_id: str) -> bytes: ...
+    async def get_collaterals_json(self, pool_id: str) -> bytes: ...
+    async def add_collaterals(self, pool_id: str, collaterals: Iterable[CollateralLike]) -> bytes: ...
+    async def set_pool_status(self, pool_id: str, is_active: bool) -> bytes: ...
+    async def recompute_pool_value(self, pool_id: str) -> bytes: ...
+    async def delete_pool(self, pool_id: str) -> None: ...
+
+# --- In-Memory Storage ---
+
+# Upper bound on pools kept in memory; the least recently used pool is evicted beyond it
+DB_CAPACITY = 100_000
+
+def _log_evicted_pool(pool_id: str, store: PoolStore) -> None:
+    """Eviction callback for `db`, so dropped pools leave a trace in the logs."""
+    logger.warning("Pool '%s' evicted from in-memory storage (capacity %d reached)", pool_id, DB_CAPACITY)
+
+# In-memory storage for simplicity, bounded by a C-implemented LRU dict
+db: "LRU[str, PoolStore]" = LRU(DB_CAPACITY, callback=_log_evicted_pool)
+
+def _pool_json(store: PoolStore) -> bytes:
+    """
+    Returns the pool encoded in the `Pool` response shape, re-encoding only if
+    the pool changed since the last call. Encodes plain dicts with orjson
+    rather than building and walking Pydantic models.
+    """
+    body = store.json_cache
+    if body is None:
+        body = store.json_cache = orjson.dumps({
+            "pool_id": store.pool_id,
+            "collaterals": collaterals_as_dicts(store),
+            "total_value_usd": store.total_value_usd,
+            "is_active": store.is_active,
+        })
+    return body
+
+class InMemoryPoolRepository:
+    """
+    Keeps pools in this process's `db`. This is the default backend; pools are
+    not visible to other worker processes.
+
+    All endpoints are `async def` and run on the single event loop, so the
+    mutations below cannot interleave today. They still run under `_lock`, so a
+    future helper that awaits mid-update cannot corrupt a pool. Keep every
+    critical section free of `await`s; a section that moves to a thread
+    executor needs a `threading.RLock` instead.
+    """
+
+    def __init__(self, pools: "LRU[str, PoolStore]") -> None:
+        self.pools = pools
+        self._lock: Optional[asyncio.Lock] = None
+
+    def _get_lock(self) -> asyncio.Lock:
+        """
+        Creates the lock on first use, from inside a running coroutine: on Python 3.8/3.9
+        an `asyncio.Lock` binds to the loop current at construction, which at import time
+        is not the loop (e.g. uvloop) the server ends up running.
+        """
+        lock = self._lock
+        if lock is None:
+            lock = self._lock = asyncio.Lock()
+        return lock
+
+    async def create_pool(self, pool_id: str, is_active: bool) -> bytes:
+        async with self._get_lock():
+            if pool_id in self.pools:
+                raise PoolExistsError(pool_id)
+            new_store = PoolStore(pool_id, is_active=is_active)
+            self.pools[pool_id] = new_store
+        return _pool_json(new_store)
+
+    async def get_pool_json(self, pool_id: str) -> bytes:
+        store = self.pools.get(pool_id)
+        if store is None:
+            raise PoolNotFoundError(pool_id)
+        return _pool_json(store)
+
+    async def get_collaterals_json(self, pool_id: str) -> bytes:
+        store = self.pools.get(pool_id)
+        if store is None:
+            raise PoolNotFoundError(pool_id)
+        return orjson.dumps(collaterals_as_dicts(store))
+
+    async def add_collaterals(self, pool_id: str, collaterals: Iterable[CollateralLike]) -> bytes:
+        async with self._get_lock():
+            store = self.pools.get(pool_id)
+            if store is None:
+                raise PoolNotFoundError(pool_id)
+            if not store.is_active:
+                raise PoolInactiveError(pool_id)
+            for collateral in collaterals:
+                add_collateral(store, collateral.asset_id, collateral.amount, collateral.value_usd)
+            compact(store)
+            store.json_cache = None
+        return _pool_json(store)
+
+    async def set_pool_status(self, pool_id: str, is_active: bool) -> bytes:
+        async with self._get_lock():
+            store = self.pools.get(pool_id)
+            if store is None:
+                raise PoolNotFoundError(pool_id)
+            store.is_active = is_active
+            store.json_cache = None
+        return _pool_json(store)
+
+    async def recompute_pool_value(self, pool_id: str) -> bytes:
+        async with self._get_lock():
+            store = self.pools.get(pool_id)
+            if store is None:
+                raise PoolNotFoundError(pool_id)
+            store.total_value_usd = calculate_pool_value(store)
+            store.json_cache = None
+        return _pool_json(store)
+
+    async def delete_pool(self, pool_id: str) -> None:
+        async with self._get_lock():
+            if self.pools.pop(pool_id, None) is None:
+                raise PoolNotFoundError(pool_id)
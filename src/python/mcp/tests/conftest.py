@@ -0,0 +1,26 @@
+import asyncio
+
+import pytest
+import pytest_asyncio
+from httpx import ASGITransport, AsyncClient
+
+# Assuming the tests are run from the `src/python/mcp` directory,
+# and `mcp_fastapi` is in the PYTHONPATH (handled by poetry)
+from mcp_fastapi.main import app
+
+# Use a base URL for the test client
+BASE_URL = "http://test"
+
+
+@pytest.fixture(scope="session")
+def event_loop():
+    """Session-wide event loop so the shared client below can outlive a single test."""
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+@pytest_asyncio.fixture(scope="session")
+async def client():
+    """One ASGI transport and client reused by every test instead of one per test."""
+    async with AsyncClient(transport=ASGITransport(app=app), base_url=BASE_URL) as ac:
+        yield ac
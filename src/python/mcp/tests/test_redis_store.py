@@ -0,0 +1,97 @@
+import os
+
+import pytest
+import pytest_asyncio
+from fastapi import status
+
+from mcp_fastapi import main
+
+# These tests run the endpoints against a real Redis server and are skipped unless
+# MCP_TEST_REDIS_URL points at one, e.g. `MCP_TEST_REDIS_URL=redis://localhost:6379/15`.
+# The database behind that URL is flushed before and after every test.
+REDIS_URL = os.environ.get("MCP_TEST_REDIS_URL")
+pytestmark = pytest.mark.skipif(not REDIS_URL, reason="MCP_TEST_REDIS_URL is not set")
+
+
+@pytest_asyncio.fixture(autouse=True)
+async def redis_pools(monkeypatch):
+    """Swaps the app's storage backend for a Redis-backed one for the duration of a test."""
+    from mcp_fastapi.redis_store import RedisPoolRepository
+
+    repository = RedisPoolRepository.from_url(REDIS_URL)
+    await repository.redis.flushdb()
+    monkeypatch.setattr(main, "pools", repository)
+    yield repository
+    await repository.redis.flushdb()
+    await repository.close()
+
+@pytest.mark.asyncio
+async def test_create_and_get_pool(client):
+    pool_id = "redis_pool"
+    response = await client.post("/pools/", json={"pool_id": pool_id})
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.json() == {"pool_id": pool_id, "collaterals": [], "total_value_usd": 0.0, "is_active": True}
+
+    response = await client.get(f"/pools/{pool_id}")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"pool_id": pool_id, "collaterals": [], "total_value_usd": 0.0, "is_active": True}
+
+    response = await client.post("/pools/", json={"pool_id": pool_id})
+    assert response.status_code == status.HTTP_409_CONFLICT
+
+@pytest.mark.asyncio
+async def test_add_collaterals_keeps_insertion_order_and_total(client):
+    pool_id = "redis_collateral_pool"
+    await client.post("/pools/", json={"pool_id": pool_id})
+    await client.post(f"/pools/{pool_id}/collaterals/", json={"asset_id": "ETH", "amount": 10.5, "value_usd": 30000.75})
+    response = await client.post(
+        f"/pools/{pool_id}/collaterals/batch",
+        json=[
+            {"asset_id": "BTC", "amount": 1, "value_usd": 50000},
+            {"asset_id": "ETH", "amount": 0.5, "value_usd": 1500.25},
+        ],
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["collaterals"] == [
+        {"asset_id": "ETH", "amount": 11.0, "value_usd": 31501.0},
+        {"asset_id": "BTC", "amount": 1.0, "value_usd": 50000.0},
+    ]
+    assert data["total_value_usd"] == 81501.0
+
+    response = await client.get(f"/pools/{pool_id}/collaterals/")
+    assert response.json() == data["collaterals"]
+
+@pytest.mark.asyncio
+async def test_status_recompute_and_delete(client, redis_pools):
+    pool_id = "redis_status_pool"
+    await client.post("/pools/", json={"pool_id": pool_id})
+    await client.post(f"/pools/{pool_id}/collaterals/", json={"asset_id": "SOL", "amount": 100, "value_usd": 15000})
+
+    response = await client.put(f"/pools/{pool_id}/status", json={"is_active": False})
+    assert response.json()["is_active"] is False
+    response = await client.post(f"/pools/{pool_id}/collaterals/", json={"asset_id": "SOL", "amount": 1, "value_usd": 150})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    await redis_pools.redis.hset(f"pool:{pool_id}", "total_value_usd", 0) # Simulate drift
+    response = await client.post(f"/pools/{pool_id}/recompute")
+    assert response.json()["total_value_usd"] == 15000
+
+    response = await client.delete(f"/pools/{pool_id}")
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    response = await client.get(f"/pools/{pool_id}")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    response = await client.delete(f"/pools/{pool_id}")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+@pytest.mark.asyncio
+async def test_missing_pool_returns_404(client):
+    for response in (
+        await client.get("/pools/ghost_pool"),
+        await client.get("/pools/ghost_pool/collaterals/"),
+        await client.post("/pools/ghost_pool/collaterals/", json={"asset_id": "BTC", "amount": 1, "value_usd": 1}),
+        await client.put("/pools/ghost_pool/status", json={"is_active": True}),
+        await client.post("/pools/ghost_pool/recompute"),
+    ):
+        assert response.status_code == status.HTTP_404_NOT_FOUND